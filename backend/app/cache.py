@@ -0,0 +1,146 @@
+import hashlib
+import mimetypes
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+@dataclass
+class CachedFile:
+    content: bytes
+    size: int
+    etag: str
+    media_type: str
+
+
+class FileCache:
+    """Byte-budgeted LRU cache of small file contents, keyed by path on disk.
+
+    Entries are only dropped by eviction or by explicit invalidation, so every
+    code path that writes, renames or deletes a stored file must call
+    ``invalidate`` (or ``invalidate_prefix``) for the affected path.
+
+    ``load`` reads the file outside the lock. An invalidation of the same path
+    while the read is in flight bumps that path's generation, and the stale
+    content is then returned to the caller but not cached.
+    """
+
+    def __init__(self, max_bytes: int, max_file_size: int, max_entries: int = 0):
+        self.max_bytes = max_bytes
+        self.max_file_size = max_file_size
+        self.max_entries = max_entries
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, CachedFile]" = OrderedDict()
+        # Paths with a load in flight: number of loads and generation
+        self._loading: Dict[str, int] = {}
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0 and self.max_file_size > 0
+
+    def get(self, path: str) -> Optional[CachedFile]:
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(path)
+            self.hits += 1
+            return entry
+
+    def load(self, path: str) -> Optional[CachedFile]:
+        """Read ``path`` into the cache if it is small enough.
+
+        Returns ``None`` when the file is missing or above the size threshold,
+        in which case the caller should stream it from disk instead.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            self._loading[path] = self._loading.get(path, 0) + 1
+            generation = self._generations.setdefault(path, 0)
+        entry = None
+        try:
+            entry = self._read(path)
+        finally:
+            with self._lock:
+                if entry is not None and self._generations[path] == generation:
+                    self._put(path, entry)
+                self._loading[path] -= 1
+                if not self._loading[path]:
+                    del self._loading[path]
+                    del self._generations[path]
+        return entry
+
+    def _read(self, path: str) -> Optional[CachedFile]:
+        try:
+            with open(path, "rb") as f:
+                size = os.fstat(f.fileno()).st_size
+                if size > self.max_file_size:
+                    return None
+                content = f.read(self.max_file_size + 1)
+        except FileNotFoundError:
+            return None
+        if len(content) > self.max_file_size:
+            return None
+        return CachedFile(
+            content=content,
+            size=len(content),
+            etag=f'"{hashlib.md5(content).hexdigest()}"',
+            media_type=mimetypes.guess_type(path)[0] or "text/plain",
+        )
+
+    def put(self, path: str, entry: CachedFile):
+        with self._lock:
+            self._put(path, entry)
+
+    def _put(self, path: str, entry: CachedFile):
+        if entry.size > self.max_file_size or entry.size > self.max_bytes:
+            return
+        old = self._entries.pop(path, None)
+        if old is not None:
+            self.current_bytes -= old.size
+        self._entries[path] = entry
+        self.current_bytes += entry.size
+        while self.current_bytes > self.max_bytes or (
+            self.max_entries and len(self._entries) > self.max_entries
+        ):
+            _, evicted = self._entries.popitem(last=False)
+            self.current_bytes -= evicted.size
+            self.evictions += 1
+
+    def invalidate(self, path: str):
+        with self._lock:
+            if path in self._generations:
+                self._generations[path] += 1
+            entry = self._entries.pop(path, None)
+            if entry is not None:
+                self.current_bytes -= entry.size
+
+    def invalidate_prefix(self, prefix: str):
+        prefix = os.path.join(prefix, "")
+        with self._lock:
+            for path in self._generations:
+                if path.startswith(prefix):
+                    self._generations[path] += 1
+            for path in [p for p in self._entries if p.startswith(prefix)]:
+                self.current_bytes -= self._entries.pop(path).size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "current_bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "max_file_size": self.max_file_size,
+            }
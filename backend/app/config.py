@@ -0,0 +1,75 @@
+import os
+from dataclasses import dataclass, fields
+from typing import Optional
+
+from dotenv import load_dotenv
+
+
+@dataclass
+class Settings:
+    secret_key: str = "your-secret-key"
+    file_storage: str = "/app/storage"
+    # Default (super admin) user created on startup if it does not exist yet
+    default_user_username: Optional[str] = None
+    default_user_password: Optional[str] = None
+    # Mount the SQLAdmin UI on /admin
+    enable_admin: bool = True
+
+    # Hot-file cache: files up to file_cache_max_file_size bytes are kept in
+    # memory, bounded by file_cache_max_bytes in total. 0 disables it.
+    file_cache_max_bytes: int = 64 * 1024 * 1024
+    file_cache_max_file_size: int = 256 * 1024
+    file_cache_max_entries: int = 0
+
+    # Transfer limits: byte rates are in bytes/s, concurrency caps count
+    # in-flight uploads and downloads. 0 disables the corresponding limit.
+    transfer_user_rate: int = 0
+    transfer_global_rate: int = 0
+    transfer_user_concurrency: int = 0
+    transfer_global_concurrency: int = 0
+    transfer_retry_after: int = 1
+    transfer_chunk_size: int = 64 * 1024
+
+    # Background deletion: rows are removed deletion_batch_size at a time and
+    # blobs are unlinked by deletion_workers threads. The status of the last
+    # deletion_max_finished_jobs finished jobs is kept.
+    deletion_batch_size: int = 500
+    deletion_workers: int = 4
+    deletion_max_finished_jobs: int = 1000
+
+    # Integrity scrubber: re-hashes stored files every scrub_interval seconds
+    # (0 disables it) reading at most scrub_rate bytes/s.
+    scrub_interval: int = 0
+    scrub_rate: int = 10 * 1024 * 1024
+
+    @classmethod
+    def from_env(cls, env_file: Optional[str] = None) -> "Settings":
+        """Build settings from the environment, after loading ``.env``.
+
+        Every field can be set with the upper-cased variable of the same name,
+        e.g. ``FILE_STORAGE`` or ``TRANSFER_USER_RATE``.
+        """
+        load_dotenv(env_file)
+        values = {}
+        for f in fields(cls):
+            value = os.getenv(f.name.upper())
+            if value is None:
+                continue
+            if isinstance(f.default, bool):
+                values[f.name] = value.lower() in ("1", "true", "yes", "on")
+            elif isinstance(f.default, int):
+                values[f.name] = int(value)
+            else:
+                values[f.name] = value
+        return cls(**values)
+
+
+_settings: Optional[Settings] = None
+
+
+def get_settings() -> Settings:
+    """Return the process-wide settings, loading them on first use."""
+    global _settings
+    if _settings is None:
+        _settings = Settings.from_env()
+    return _settings
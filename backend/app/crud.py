@@ -1,13 +1,18 @@
-from datetime import datetime
+from datetime import date, datetime
 from typing import List, Optional
 
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from . import models, schemas
 from .security import get_password_hash, verify_password
 
 
+def get_user(db: Session, user_id: int):
+    return db.query(models.User).filter(models.User.id == user_id).first()
+
+
 def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
 
@@ -38,8 +43,46 @@ def create_file(db: Session, file: schemas.FileCreate, user_id: int):
     return db_file
 
 
+def get_file(db: Session, file_id: int, user_id: int):
+    return (
+        db.query(models.File)
+        .filter(
+            models.File.id == file_id,
+            models.File.owner_id == user_id,
+            models.File.pending_delete.isnot(True),
+        )
+        .first()
+    )
+
+
+def get_file_by_filename(db: Session, filename: str, user_id: int):
+    return (
+        db.query(models.File)
+        .filter(
+            models.File.filename == filename,
+            models.File.owner_id == user_id,
+            models.File.pending_delete.isnot(True),
+        )
+        .first()
+    )
+
+
+def update_file_contents(db: Session, file: models.File, size: int, checksum: str):
+    file.size = size
+    file.checksum = checksum
+    file.checksum_verified_at = None
+    file.checksum_failed_at = None
+    db.commit()
+    db.refresh(file)
+    return file
+
+
 def get_files(db: Session, user_id: int):
-    files = db.query(models.File).filter(models.File.owner_id == user_id).all()
+    files = (
+        db.query(models.File)
+        .filter(models.File.owner_id == user_id, models.File.pending_delete.isnot(True))
+        .all()
+    )
     return [file.filename for file in files]
 
 
@@ -65,33 +108,41 @@ def change_password(db: Session, user_id: int, password_data: schemas.PasswordCh
 
 
 def delete_user(db: Session, user_id: int):
-    user = db.query(models.User).filter(models.User.id == user_id).first()
-    if user:
-        db.delete(user)
+    """Mark a user as pending deletion.
+
+    The rows and blobs are removed later by ``deletion.DeletionManager``.
+    """
+    user = get_user(db, user_id)
+    if user and not user.pending_delete:
+        user.pending_delete = True
         db.commit()
-        return True
-    return False
+        return user
+    return None
 
 
 def delete_file(db: Session, file_id: int, user_id: int):
-    file = (
-        db.query(models.File)
-        .filter(models.File.id == file_id, models.File.owner_id == user_id)
-        .first()
-    )
+    """Mark a file as pending deletion, see ``delete_user``."""
+    file = get_file(db, file_id, user_id)
     if file:
-        db.delete(file)
+        file.pending_delete = True
         db.commit()
-        return True
-    return False
+        return file
+    return None
 
 
-def rename_file(db: Session, file_id: int, new_filename: str, user_id: int):
-    file = (
+def get_pending_deletions(db: Session):
+    users = db.query(models.User).filter(models.User.pending_delete.is_(True)).all()
+    files = (
         db.query(models.File)
-        .filter(models.File.id == file_id, models.File.owner_id == user_id)
-        .first()
+        .join(models.User, models.File.owner_id == models.User.id)
+        .filter(models.File.pending_delete.is_(True), models.User.pending_delete.isnot(True))
+        .all()
     )
+    return users, files
+
+
+def rename_file(db: Session, file_id: int, new_filename: str, user_id: int):
+    file = get_file(db, file_id, user_id)
     if file:
         file.filename = new_filename
         db.commit()
@@ -104,7 +155,9 @@ def search_files(db: Session, query: str, user_id: int):
     return (
         db.query(models.File)
         .filter(
-            models.File.owner_id == user_id, models.File.filename.ilike(f"%{query}%")
+            models.File.owner_id == user_id,
+            models.File.pending_delete.isnot(True),
+            models.File.filename.ilike(f"%{query}%"),
         )
         .all()
     )
@@ -119,7 +172,9 @@ def filter_files(
     end_date: Optional[datetime],
     user_id: int,
 ):
-    query = db.query(models.File).filter(models.File.owner_id == user_id)
+    query = db.query(models.File).filter(
+        models.File.owner_id == user_id, models.File.pending_delete.isnot(True)
+    )
     if file_type:
         query = query.filter(models.File.file_type == file_type)
     if min_size:
@@ -147,19 +202,93 @@ def user_activity_log(db: Session, user_id: int):
     )
 
 
-def usage_statistics(db: Session, user_id: int):
-    total_uploads = (
-        db.query(models.File).filter(models.File.owner_id == user_id).count()
+def create_user_activity_log(db: Session, user_id: int, action: str):
+    log = models.UserActivityLog(
+        user_id=user_id, action=action, timestamp=datetime.utcnow()
     )
-    total_storage_used = (
-        db.query(func.sum(models.File.size))
-        .filter(models.File.owner_id == user_id)
-        .scalar()
-        or 0
-    )
-    return {"total_uploads": total_uploads, "total_storage_used": total_storage_used}
+    db.add(log)
+    db.commit()
+    return log
+
+
+USAGE_COUNTERS = ["uploads", "downloads", "bytes_in", "bytes_out", "storage_delta"]
+
+
+def record_usage(db: Session, user_id: int, day: Optional[date] = None, **counters):
+    """Add ``counters`` (see ``USAGE_COUNTERS``) to the user's rollup for ``day``."""
+    day = day or datetime.utcnow().date()
+    counters = {name: value for name, value in counters.items() if value}
+    if not counters:
+        return
+    row_filter = (models.UsageDaily.user_id == user_id, models.UsageDaily.day == day)
+    increments = {
+        getattr(models.UsageDaily, name): getattr(models.UsageDaily, name) + value
+        for name, value in counters.items()
+    }
+    if not db.query(models.UsageDaily).filter(*row_filter).update(
+        increments, synchronize_session=False
+    ):
+        db.add(models.UsageDaily(user_id=user_id, day=day, **counters))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another request created today's row first, add to it instead
+        db.rollback()
+        db.query(models.UsageDaily).filter(*row_filter).update(
+            increments, synchronize_session=False
+        )
+        db.commit()
 
 
-# def generate_reports(db: Session, start_date: Optional[datetime], end_date: Optional[datetime], user_id: int):
-#     # Implement your report generation logic here
-#     pass
+def usage_statistics(db: Session, user_id: int):
+    totals = (
+        db.query(
+            *(
+                func.coalesce(func.sum(getattr(models.UsageDaily, name)), 0)
+                for name in USAGE_COUNTERS
+            )
+        )
+        .filter(models.UsageDaily.user_id == user_id)
+        .one()
+    )
+    uploads, downloads, bytes_in, bytes_out, storage_used = totals
+    return {
+        "total_uploads": uploads,
+        "total_downloads": downloads,
+        "total_bytes_in": bytes_in,
+        "total_bytes_out": bytes_out,
+        "total_storage_used": storage_used,
+    }
+
+
+def generate_reports(
+    db: Session, start_date: Optional[date], end_date: Optional[date], user_id: int
+):
+    query = db.query(models.UsageDaily).filter(models.UsageDaily.user_id == user_id)
+    storage_used = 0
+    if start_date:
+        storage_used = (
+            db.query(func.coalesce(func.sum(models.UsageDaily.storage_delta), 0))
+            .filter(
+                models.UsageDaily.user_id == user_id,
+                models.UsageDaily.day < start_date,
+            )
+            .scalar()
+        )
+        query = query.filter(models.UsageDaily.day >= start_date)
+    if end_date:
+        query = query.filter(models.UsageDaily.day <= end_date)
+    days = []
+    for row in query.order_by(models.UsageDaily.day):
+        storage_used += row.storage_delta
+        days.append(
+            {
+                "day": row.day,
+                "uploads": row.uploads,
+                "downloads": row.downloads,
+                "bytes_in": row.bytes_in,
+                "bytes_out": row.bytes_out,
+                "storage_used": storage_used,
+            }
+        )
+    return days
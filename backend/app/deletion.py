@@ -0,0 +1,231 @@
+import os
+import shutil
+import threading
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Deque, Dict, Optional
+
+from sqlalchemy import select
+
+from . import crud, models
+from .database import SessionLocal
+
+TRASH_DIR = ".trash"
+
+
+class DeletionInterrupted(Exception):
+    pass
+
+
+@dataclass
+class DeletionJob:
+    kind: str
+    target_id: int
+    # User who asked for the deletion, None for jobs resumed on startup
+    requested_by: Optional[int] = None
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    status: str = "pending"
+    rows_total: int = 0
+    rows_deleted: int = 0
+    blobs_deleted: int = 0
+    error: Optional[str] = None
+    created_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+
+
+class DeletionManager:
+    """Runs account and file deletions in the background.
+
+    The endpoints only flag the row as ``pending_delete`` and move the blob or
+    user directory into FILE_STORAGE/.trash, which is a single rename. The job
+    then deletes the dependent rows in batches of ``batch_size``, committing
+    after each batch so the SQLite write lock is only held briefly, and
+    unlinks the blobs with a pool of ``blob_workers`` threads. Jobs run one
+    at a time to avoid competing for the write lock.
+
+    ``shutdown`` stops the running job between batches and drops the queued
+    ones; their rows are still flagged, so ``resume_pending`` picks them up on
+    the next start. Only the last ``max_finished_jobs`` finished jobs are kept
+    for status queries.
+    """
+
+    def __init__(
+        self,
+        storage: str,
+        batch_size: int = 500,
+        blob_workers: int = 4,
+        max_finished_jobs: int = 1000,
+    ):
+        self.storage = storage
+        self.trash = os.path.join(storage, TRASH_DIR)
+        self.batch_size = batch_size
+        self.blob_workers = blob_workers
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs: Dict[str, DeletionJob] = {}
+        self._finished: Deque[str] = deque()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    def get(self, job_id: str, requested_by: int) -> Optional[dict]:
+        job = self.jobs.get(job_id)
+        if job is None or job.requested_by != requested_by:
+            return None
+        return asdict(job)
+
+    def delete_user(
+        self, user: models.User, requested_by: Optional[int] = None
+    ) -> DeletionJob:
+        source = os.path.join(self.storage, user.username)
+        trash_path = self._move_to_trash(source, f"user-{user.id}")
+        job = DeletionJob(kind="user", target_id=user.id, requested_by=requested_by)
+        return self._submit(job, trash_path)
+
+    def delete_file(
+        self,
+        file: models.File,
+        resume: bool = False,
+        requested_by: Optional[int] = None,
+    ) -> DeletionJob:
+        trash_path = os.path.join(self.trash, f"file-{file.id}")
+        if not resume:
+            source = os.path.join(self.storage, file.owner.username, file.filename)
+            trash_path = self._move_to_trash(source, f"file-{file.id}")
+        job = DeletionJob(kind="file", target_id=file.id, requested_by=requested_by)
+        return self._submit(job, trash_path)
+
+    def resume_pending(self, db):
+        """Reschedule deletions left unfinished by a previous process."""
+        users, files = crud.get_pending_deletions(db)
+        for user in users:
+            # Pending users cannot log in, so nothing new can have been written
+            # to their directory and it is safe to move it if it is still there
+            self.delete_user(user)
+        for file in files:
+            # The owner may have uploaded a new file under the same name since,
+            # so only what is already in the trash is deleted
+            self.delete_file(file, resume=True)
+
+    def shutdown(self):
+        self._stopping.set()
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+    def _check_stopping(self):
+        if self._stopping.is_set():
+            raise DeletionInterrupted("Interrupted by shutdown")
+
+    def _move_to_trash(self, source: str, name: str) -> str:
+        os.makedirs(self.trash, exist_ok=True)
+        trash_path = os.path.join(self.trash, name)
+        if os.path.exists(source):
+            os.replace(source, trash_path)
+        return trash_path
+
+    def _submit(self, job: DeletionJob, trash_path: str) -> DeletionJob:
+        with self._lock:
+            self.jobs[job.id] = job
+        self._executor.submit(self._run, job, trash_path)
+        return job
+
+    def _run(self, job: DeletionJob, trash_path: str):
+        job.status = "running"
+        try:
+            if job.kind == "user":
+                self._purge_user(job, trash_path)
+            else:
+                self._purge_file(job, trash_path)
+            job.status = "done"
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        job.finished_at = datetime.utcnow()
+        with self._lock:
+            self._finished.append(job.id)
+            while len(self._finished) > self.max_finished_jobs:
+                del self.jobs[self._finished.popleft()]
+
+    def _purge_user(self, job: DeletionJob, trash_path: str):
+        user_id = job.target_id
+        file_ids = select(models.File.id).where(models.File.owner_id == user_id)
+        criteria = [
+            (models.FileHistory, models.FileHistory.user_id == user_id),
+            (models.FileHistory, models.FileHistory.file_id.in_(file_ids)),
+            (models.UserActivityLog, models.UserActivityLog.user_id == user_id),
+            (models.UsageDaily, models.UsageDaily.user_id == user_id),
+            (models.File, models.File.owner_id == user_id),
+        ]
+        db = SessionLocal()
+        try:
+            job.rows_total = 1 + sum(
+                db.query(model).filter(criterion).count()
+                for model, criterion in criteria
+            )
+        finally:
+            db.close()
+        for model, criterion in criteria:
+            self._delete_rows(job, model, criterion)
+        self._unlink_tree(job, trash_path)
+        self._delete_rows(job, models.User, models.User.id == user_id)
+
+    def _purge_file(self, job: DeletionJob, trash_path: str):
+        file_id = job.target_id
+        criteria = [
+            (models.FileHistory, models.FileHistory.file_id == file_id),
+            (models.File, models.File.id == file_id),
+        ]
+        db = SessionLocal()
+        try:
+            job.rows_total = sum(
+                db.query(model).filter(criterion).count()
+                for model, criterion in criteria
+            )
+        finally:
+            db.close()
+        history, file = criteria
+        self._delete_rows(job, *history)
+        if os.path.exists(trash_path):
+            os.remove(trash_path)
+            job.blobs_deleted += 1
+        self._delete_rows(job, *file)
+
+    def _delete_rows(self, job: DeletionJob, model, criterion):
+        while True:
+            self._check_stopping()
+            db = SessionLocal()
+            try:
+                ids = [
+                    row_id
+                    for (row_id,) in db.query(model.id)
+                    .filter(criterion)
+                    .limit(self.batch_size)
+                ]
+                if not ids:
+                    return
+                db.query(model).filter(model.id.in_(ids)).delete(
+                    synchronize_session=False
+                )
+                db.commit()
+            finally:
+                db.close()
+            job.rows_deleted += len(ids)
+
+    def _unlink_tree(self, job: DeletionJob, path: str):
+        if not os.path.isdir(path):
+            return
+
+        def unlink(entry_path):
+            os.remove(entry_path)
+            return 1
+
+        with ThreadPoolExecutor(max_workers=self.blob_workers) as pool:
+            for root, _, filenames in os.walk(path):
+                paths = [os.path.join(root, name) for name in filenames]
+                for i in range(0, len(paths), self.batch_size):
+                    self._check_stopping()
+                    job.blobs_deleted += sum(
+                        pool.map(unlink, paths[i : i + self.batch_size])
+                    )
+        shutil.rmtree(path, ignore_errors=True)
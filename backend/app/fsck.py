@@ -0,0 +1,255 @@
+"""Consistency checker for FILE_STORAGE and the ``files`` table.
+
+Run from the backend directory::
+
+    python -m app.fsck [--repair] [--state-file fsck.json] [--workers 8]
+
+The check runs in three passes, each working in small batches with a fresh,
+short-lived session so it never holds a long transaction on the database:
+
+* ``rows``: walks ``files`` by primary key and stats every blob to find
+  dangling rows (no file on disk) and size mismatches.
+* ``blobs``: walks ``users`` by primary key and scans each user directory to
+  find orphaned blobs (a file on disk without a row).
+* ``dirs``: scans the top level of FILE_STORAGE for directories that do not
+  belong to any user.
+
+This is the one place missing and orphaned blobs are dealt with: the rest of
+the backend (filespace, the scrubber, the migration, resumed deletions) just
+skips them. Files and users pending deletion are left to the deletion jobs.
+Dot-directories at the top of FILE_STORAGE (``.trash``, ``.uploads``) are
+internal and skipped.
+
+With ``--state-file`` the position is saved after every batch, so an
+interrupted run picks up where it stopped. With ``--repair`` dangling rows are
+deleted, sizes are corrected and orphaned blobs are adopted as new rows, and
+the storage figures in the usage rollups are adjusted to match; orphaned
+directories are only reported.
+"""
+import argparse
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from . import crud, models
+from .config import get_settings
+from .database import SessionLocal
+
+PHASES = ["rows", "blobs", "dirs", "done"]
+
+
+class Checker:
+    def __init__(self, storage, repair=False, batch_size=500, workers=8, state_file=None):
+        self.storage = storage
+        self.repair = repair
+        self.batch_size = batch_size
+        self.workers = workers
+        self.state_file = state_file
+        self.state = {"phase": "rows", "last_id": 0, "counts": {}}
+        if state_file and os.path.exists(state_file):
+            with open(state_file) as f:
+                self.state = json.load(f)
+
+    def save_state(self):
+        if not self.state_file:
+            return
+        tmp_path = f"{self.state_file}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_file)
+
+    def report(self, issue, **details):
+        counts = self.state["counts"]
+        counts[issue] = counts.get(issue, 0) + 1
+        print(issue, " ".join(f"{k}={v}" for k, v in details.items()), flush=True)
+
+    def advance(self, last_id):
+        self.state["last_id"] = last_id
+        self.save_state()
+
+    def next_phase(self):
+        self.state["phase"] = PHASES[PHASES.index(self.state["phase"]) + 1]
+        self.state["last_id"] = 0
+        self.save_state()
+
+    def run(self):
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            if self.state["phase"] == "rows":
+                self.check_rows(pool)
+                self.next_phase()
+            if self.state["phase"] == "blobs":
+                self.check_blobs(pool)
+                self.next_phase()
+            if self.state["phase"] == "dirs":
+                self.check_dirs()
+                self.next_phase()
+        return self.state["counts"]
+
+    def check_rows(self, pool):
+        while True:
+            db = SessionLocal()
+            try:
+                rows = (
+                    db.query(models.File, models.User.username)
+                    .join(models.User, models.File.owner_id == models.User.id)
+                    .filter(
+                        models.File.id > self.state["last_id"],
+                        models.File.pending_delete.isnot(True),
+                        models.User.pending_delete.isnot(True),
+                    )
+                    .order_by(models.File.id)
+                    .limit(self.batch_size)
+                    .all()
+                )
+                if not rows:
+                    return
+                paths = [
+                    os.path.join(self.storage, username, file.filename)
+                    for file, username in rows
+                ]
+                for (file, _), path, size in zip(rows, paths, pool.map(file_size, paths)):
+                    if size is None:
+                        self.report("dangling_row", id=file.id, path=path)
+                        if self.repair:
+                            crud.record_usage(
+                                db, file.owner_id, storage_delta=-(file.size or 0)
+                            )
+                            db.delete(file)
+                    elif file.size != size:
+                        self.report(
+                            "size_mismatch", id=file.id, path=path, recorded=file.size, actual=size
+                        )
+                        if self.repair:
+                            crud.record_usage(
+                                db, file.owner_id, storage_delta=size - (file.size or 0)
+                            )
+                            file.size = size
+                if self.repair:
+                    db.commit()
+                last_id = rows[-1][0].id
+            finally:
+                db.close()
+            self.advance(last_id)
+
+    def check_blobs(self, pool):
+        while True:
+            db = SessionLocal()
+            try:
+                users = (
+                    db.query(models.User.id, models.User.username)
+                    .filter(
+                        models.User.id > self.state["last_id"],
+                        models.User.pending_delete.isnot(True),
+                    )
+                    .order_by(models.User.id)
+                    .limit(self.workers)
+                    .all()
+                )
+            finally:
+                db.close()
+            if not users:
+                return
+            # One user directory per worker; the checkpoint only moves once the
+            # whole batch is done, so a resumed run rescans at most one batch.
+            for orphans in pool.map(self.check_user_dir, users):
+                for path, size in orphans:
+                    self.report("orphaned_blob", path=path, size=size)
+            self.advance(users[-1].id)
+
+    def check_user_dir(self, user):
+        user_id, username = user
+        user_dir = os.path.join(self.storage, username)
+        orphans = []
+        try:
+            entries = os.scandir(user_dir)
+        except FileNotFoundError:
+            return orphans
+        with entries:
+            names = (entry.name for entry in entries if entry.is_file())
+            while True:
+                batch = list(islice(names, self.batch_size))
+                if not batch:
+                    break
+                db = SessionLocal()
+                try:
+                    known = {
+                        filename
+                        for (filename,) in db.query(models.File.filename).filter(
+                            models.File.owner_id == user_id,
+                            models.File.filename.in_(batch),
+                        )
+                    }
+                    for name in batch:
+                        if name in known:
+                            continue
+                        path = os.path.join(user_dir, name)
+                        size = file_size(path)
+                        orphans.append((path, size))
+                        if self.repair and size is not None:
+                            db.add(models.File(filename=name, size=size, owner_id=user_id))
+                            crud.record_usage(db, user_id, storage_delta=size)
+                    if self.repair:
+                        db.commit()
+                finally:
+                    db.close()
+        return orphans
+
+    def check_dirs(self):
+        with os.scandir(self.storage) as entries:
+            names = (
+                entry.name
+                for entry in entries
+                if entry.is_dir() and not entry.name.startswith(".")
+            )
+            while True:
+                batch = list(islice(names, self.batch_size))
+                if not batch:
+                    return
+                db = SessionLocal()
+                try:
+                    known = {
+                        username
+                        for (username,) in db.query(models.User.username).filter(
+                            models.User.username.in_(batch)
+                        )
+                    }
+                finally:
+                    db.close()
+                for name in batch:
+                    if name not in known:
+                        self.report("orphaned_dir", path=os.path.join(self.storage, name))
+
+
+def file_size(path):
+    try:
+        return os.stat(path).st_size
+    except FileNotFoundError:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--storage", default=get_settings().file_storage)
+    parser.add_argument("--repair", action="store_true", help="fix the issues found")
+    parser.add_argument("--state-file", help="checkpoint file used to resume a run")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    checker = Checker(
+        storage=args.storage,
+        repair=args.repair,
+        batch_size=args.batch_size,
+        workers=args.workers,
+        state_file=args.state_file,
+    )
+    if checker.state["phase"] == "done":
+        print(f"Nothing to do, remove {args.state_file} to start a new run")
+        return
+    counts = checker.run()
+    print("summary", json.dumps(counts))
+
+
+if __name__ == "__main__":
+    main()
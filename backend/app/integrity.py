@@ -0,0 +1,180 @@
+"""Checksums for stored files and a background scrubber that re-verifies them.
+
+Every upload stores the SHA-256 of its content on ``files.checksum``. The
+scrubber walks the ``files`` table by primary key, rehashes each blob at a
+throttled read rate and compares the result. Files without a checksum (uploaded
+before checksums existed) get one recorded on their first pass. A mismatch is
+recorded on ``files.checksum_failed_at`` and printed and logged to the owner's
+activity log once, not on every pass; it is cleared when the file is uploaded
+again or its blob matches again.
+
+Run a single pass from the backend directory with::
+
+    python -m app.integrity --rate 10485760
+"""
+import argparse
+import base64
+import hashlib
+import os
+import threading
+import time
+import traceback
+from datetime import datetime
+from typing import Optional
+
+from . import crud, models
+from .config import get_settings
+from .database import SessionLocal
+from .throttle import TokenBucket
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def new_hash():
+    return hashlib.sha256()
+
+
+def digest_header(checksum: str) -> str:
+    """Format a hex SHA-256 checksum as an RFC 3230 ``Digest`` header value."""
+    return "sha-256=" + base64.b64encode(bytes.fromhex(checksum)).decode("ascii")
+
+
+def file_checksum(path: str, bucket: Optional[TokenBucket] = None) -> Optional[str]:
+    """Hash ``path`` in chunks, pacing reads with ``bucket`` if given."""
+    checksum = new_hash()
+    try:
+        with open(path, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                if bucket is not None:
+                    time.sleep(bucket.reserve(len(chunk)))
+                checksum.update(chunk)
+    except FileNotFoundError:
+        return None
+    return checksum.hexdigest()
+
+
+class Scrubber:
+    def __init__(self, storage: str, rate: int = 0, batch_size: int = 100):
+        self.storage = storage
+        self.bucket = TokenBucket(rate, capacity=max(rate, CHUNK_SIZE))
+        self.batch_size = batch_size
+        self.verified = 0
+        self.corrupt = 0
+        self.last_id = 0
+
+    def run_pass(self, stop: Optional[threading.Event] = None):
+        self.last_id = 0
+        while stop is None or not stop.is_set():
+            db = SessionLocal()
+            try:
+                rows = (
+                    db.query(models.File, models.User.username)
+                    .join(models.User, models.File.owner_id == models.User.id)
+                    .filter(
+                        models.File.id > self.last_id,
+                        models.File.pending_delete.isnot(True),
+                        models.User.pending_delete.isnot(True),
+                    )
+                    .order_by(models.File.id)
+                    .limit(self.batch_size)
+                    .all()
+                )
+            finally:
+                db.close()
+            if not rows:
+                return
+            for file, username in rows:
+                self.check(file, os.path.join(self.storage, username, file.filename))
+                if stop is not None and stop.is_set():
+                    return
+            self.last_id = rows[-1][0].id
+
+    def check(self, file: models.File, path: str):
+        # Hash outside of any session so the database is not held during I/O
+        checksum = file_checksum(path, self.bucket)
+        if checksum is None:
+            # Missing blob, nothing to verify
+            return
+        db = SessionLocal()
+        try:
+            current = (
+                db.query(models.File.checksum, models.File.checksum_failed_at)
+                .filter(models.File.id == file.id)
+                .first()
+            )
+            if current is None or current.checksum != file.checksum:
+                # Deleted or overwritten while it was being hashed
+                return
+            if file.checksum is not None and checksum != file.checksum:
+                self.corrupt += 1
+                if current.checksum_failed_at is not None:
+                    # Already reported on an earlier pass
+                    return
+                db.query(models.File).filter(models.File.id == file.id).update(
+                    {models.File.checksum_failed_at: datetime.utcnow()},
+                    synchronize_session=False,
+                )
+                print(
+                    f"corrupt id={file.id} path={path}"
+                    f" expected={file.checksum} actual={checksum}",
+                    flush=True,
+                )
+                crud.create_user_activity_log(
+                    db=db,
+                    user_id=file.owner_id,
+                    action=f"Integrity check failed for file '{file.filename}'",
+                )
+                return
+            values = {
+                models.File.checksum_verified_at: datetime.utcnow(),
+                models.File.checksum_failed_at: None,
+            }
+            if file.checksum is None:
+                values[models.File.checksum] = checksum
+            db.query(models.File).filter(models.File.id == file.id).update(
+                values, synchronize_session=False
+            )
+            db.commit()
+            self.verified += 1
+        finally:
+            db.close()
+
+
+def start_scrubber(storage: str, rate: int, interval: int) -> threading.Event:
+    """Scrub continuously in a daemon thread; set the returned event to stop."""
+    stop = threading.Event()
+    scrubber = Scrubber(storage, rate=rate)
+
+    def loop():
+        while not stop.is_set():
+            try:
+                scrubber.run_pass(stop)
+            except Exception:
+                # e.g. the database is locked or unavailable, retry next interval
+                print("scrub pass failed", flush=True)
+                traceback.print_exc()
+            stop.wait(interval)
+
+    threading.Thread(target=loop, name="scrubber", daemon=True).start()
+    return stop
+
+
+def main(argv=None):
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description="Re-verify stored file checksums")
+    parser.add_argument("--storage", default=settings.file_storage)
+    parser.add_argument(
+        "--rate",
+        type=int,
+        default=settings.scrub_rate,
+        help="read rate in bytes/s, 0 for unlimited",
+    )
+    args = parser.parse_args(argv)
+
+    scrubber = Scrubber(args.storage, rate=args.rate)
+    scrubber.run_pass()
+    print(f"summary verified={scrubber.verified} corrupt={scrubber.corrupt}")
+
+
+if __name__ == "__main__":
+    main()
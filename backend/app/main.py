@@ -1,56 +1,156 @@
+import csv
+import io
+import mimetypes
 import os
-import shutil
-from datetime import datetime, timedelta
+import uuid
+from contextlib import asynccontextmanager
+from datetime import date, datetime, timedelta
 from typing import List, Optional
 
 from app import crud, models, schemas, security
-from fastapi import Depends, FastAPI, File, HTTPException, UploadFile, status
-from fastapi.responses import FileResponse
+from fastapi import (
+    APIRouter,
+    Depends,
+    FastAPI,
+    File,
+    Header,
+    HTTPException,
+    Request,
+    UploadFile,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from sqladmin import Admin, ModelView
 from sqlalchemy.orm import Session
+from starlette.background import BackgroundTask
 
 from . import crud
-from .database import Base, SessionLocal, engine
+from .cache import FileCache
+from .config import Settings, get_settings
+from .database import SessionLocal, engine
+from .deletion import DeletionManager
+from .integrity import digest_header, new_hash, start_scrubber
+from .throttle import TooManyTransfers, TransferLimiter
 
-Base.metadata.create_all(bind=engine)
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Uploads are written here first and moved into place once complete
+UPLOAD_TMP_DIR = ".uploads"
 
-app = FastAPI()
-# Initialize SQLAdmin and bind it to the app
-admin = Admin(app, engine)
-# Load environment variables
-from dotenv import load_dotenv
+router = APIRouter()
 
-load_dotenv()
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-# Load default user credentials
-DEFAULT_USER_USERNAME = os.getenv("DEFAULT_USER_USERNAME")
-DEFAULT_USER_PASSWORD = os.getenv("DEFAULT_USER_PASSWORD")
 
-SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key")
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
-FILE_STORAGE = "/app/storage"
+def create_app(app_settings: Optional[Settings] = None) -> FastAPI:
+    """Build the application.
 
-os.makedirs(FILE_STORAGE, exist_ok=True)
+    The database schema is not touched here, run ``python -m app.migrate``
+    before starting the server.
+    """
+    settings = app_settings or get_settings()
+    os.makedirs(os.path.join(settings.file_storage, UPLOAD_TMP_DIR), exist_ok=True)
+
+    app = FastAPI(lifespan=lifespan)
+    app.state.settings = settings
+    app.state.file_cache = FileCache(
+        max_bytes=settings.file_cache_max_bytes,
+        max_file_size=settings.file_cache_max_file_size,
+        max_entries=settings.file_cache_max_entries,
+    )
+    app.state.transfer_limiter = TransferLimiter(
+        user_rate=settings.transfer_user_rate,
+        global_rate=settings.transfer_global_rate,
+        user_concurrency=settings.transfer_user_concurrency,
+        global_concurrency=settings.transfer_global_concurrency,
+        retry_after=settings.transfer_retry_after,
+    )
+    app.state.deletion_manager = DeletionManager(
+        storage=settings.file_storage,
+        batch_size=settings.deletion_batch_size,
+        blob_workers=settings.deletion_workers,
+        max_finished_jobs=settings.deletion_max_finished_jobs,
+    )
+
+    app.include_router(router)
+    if settings.enable_admin:
+        mount_admin(app)
+    return app
+
+
+def mount_admin(app: FastAPI):
+    # SQLAdmin is only imported when the admin UI is enabled
+    from sqladmin import Admin, ModelView
+
+    # Define admin views for User model
+    class UserAdmin(ModelView, model=models.User):
+        column_list = ["id", "username", "email", "full_name", "disabled"]
+
+    # Define admin views for File model
+    class FileAdmin(ModelView, model=models.File):
+        column_list = ["id", "filename", "owner"]
+
+    # Initialize SQLAdmin, bind it to the app and add the views
+    admin = Admin(app, engine)
+    admin.add_view(UserAdmin)
+    admin.add_view(FileAdmin)
+
+
+# Per-app state set up by create_app
+def get_app_settings(request: Request) -> Settings:
+    return request.app.state.settings
+
+
+def get_file_cache(request: Request) -> FileCache:
+    return request.app.state.file_cache
 
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+def get_transfer_limiter(request: Request) -> TransferLimiter:
+    return request.app.state.transfer_limiter
 
-# Define admin views for User model
-class UserAdmin(ModelView, model=models.User):
-    column_list = ["id", "username", "email", "full_name", "disabled"]
 
+def get_deletion_manager(request: Request) -> DeletionManager:
+    return request.app.state.deletion_manager
 
-# Define admin views for File model
-class FileAdmin(ModelView, model=models.File):
-    column_list = ["id", "filename", "owner"]
 
+def acquire_transfer_slot(transfer_limiter: TransferLimiter, user_id: int):
+    try:
+        return transfer_limiter.acquire(user_id)
+    except TooManyTransfers as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many concurrent transfers",
+            headers={"Retry-After": str(e.retry_after)},
+        )
+
+
+def check_filename(filename: str):
+    # Filenames are used as paths inside the user's directory
+    if filename in ("", ".", "..") or os.path.basename(filename) != filename:
+        raise HTTPException(status_code=400, detail="Invalid filename")
 
-# Add UserAdmin and FileAdmin views to the SQLAdmin instance
-admin.add_view(UserAdmin)
-admin.add_view(FileAdmin)
+
+def check_username(username: str):
+    # Usernames name the user's directory in FILE_STORAGE, next to the internal
+    # dot-directories
+    if (
+        not username
+        or username.startswith(".")
+        or os.path.basename(username) != username
+    ):
+        raise HTTPException(status_code=400, detail="Invalid username")
+
+
+async def iter_file(file_path: str, slot, chunk_size: int):
+    try:
+        with open(file_path, "rb") as f:
+            while chunk := f.read(chunk_size):
+                await slot.throttle(len(chunk))
+                yield chunk
+    finally:
+        slot.release()
 
 
 def get_db():
@@ -62,15 +162,15 @@ def get_db():
 
 
 # Super Admin creation
-def create_default_user():
+def create_default_user(settings: Settings):
     db = SessionLocal()
     try:
-        if DEFAULT_USER_USERNAME and DEFAULT_USER_PASSWORD:
-            if not crud.get_user_by_username(db, username=DEFAULT_USER_USERNAME):
+        if settings.default_user_username and settings.default_user_password:
+            if not crud.get_user_by_username(db, username=settings.default_user_username):
                 default_user = schemas.UserCreate(
-                    username=DEFAULT_USER_USERNAME,
-                    password=DEFAULT_USER_PASSWORD,
-                    email=f"{DEFAULT_USER_USERNAME}@example.com",
+                    username=settings.default_user_username,
+                    password=settings.default_user_password,
+                    email=f"{settings.default_user_username}@example.com",
                     full_name="Default User",
                 )
                 crud.create_user(db=db, user=default_user)
@@ -78,19 +178,35 @@ def create_default_user():
         db.close()
 
 
-# Call create_default_user function to create default user
-@app.on_event("startup")
-async def startup_event():
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     # This code will run when the application starts up
-    create_default_user()
+    settings = app.state.settings
+    create_default_user(settings)
+    db = SessionLocal()
+    try:
+        app.state.deletion_manager.resume_pending(db)
+    finally:
+        db.close()
+    stop_scrubber = None
+    if settings.scrub_interval:
+        stop_scrubber = start_scrubber(
+            settings.file_storage, settings.scrub_rate, settings.scrub_interval
+        )
+    yield
+    if stop_scrubber is not None:
+        stop_scrubber.set()
+    app.state.deletion_manager.shutdown()
 
 
-@app.post("/token", response_model=schemas.Token)
+@router.post("/token", response_model=schemas.Token)
 async def login_for_access_token(
-    form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)
+    form_data: OAuth2PasswordRequestForm = Depends(),
+    db: Session = Depends(get_db),
+    settings: Settings = Depends(get_app_settings),
 ):
     user = crud.get_user_by_username(db, username=form_data.username)
-    if not user or not security.verify_password(
+    if not user or user.pending_delete or not security.verify_password(
         form_data.password, user.hashed_password
     ):
         raise HTTPException(
@@ -100,24 +216,30 @@ async def login_for_access_token(
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+        data={"sub": user.username},
+        secret_key=settings.secret_key,
+        expires_delta=access_token_expires,
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
 
-def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+def create_access_token(
+    data: dict, secret_key: str, expires_delta: Optional[timedelta] = None
+):
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, secret_key, algorithm=ALGORITHM)
     return encoded_jwt
 
 
 async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)
+    token: str = Depends(oauth2_scheme),
+    db: Session = Depends(get_db),
+    settings: Settings = Depends(get_app_settings),
 ):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -125,20 +247,21 @@ async def get_current_user(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, settings.secret_key, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
     user = crud.get_user_by_username(db, username=username)
-    if user is None:
+    if user is None or user.pending_delete:
         raise credentials_exception
     return user
 
 
-@app.post("/users/", response_model=schemas.User)
+@router.post("/users/", response_model=schemas.User)
 def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    check_username(user.username)
     db_user = crud.get_user_by_username(db, username=user.username)
     if db_user:
         raise HTTPException(status_code=400, detail="Username already registered")
@@ -146,60 +269,169 @@ def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
 
 
 # Endpoint to list users
-@app.get("/users/", response_model=List[schemas.User])
+@router.get("/users/", response_model=List[schemas.User])
 async def list_users(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
     return crud.get_users(db, skip=skip, limit=limit)
 
 
+# Disk writes run on the threadpool so they do not block the event loop
+def write_chunk(buffer, file_hash, chunk: bytes):
+    buffer.write(chunk)
+    file_hash.update(chunk)
+
+
+def sync_file(buffer):
+    buffer.flush()
+    os.fsync(buffer.fileno())
+
+
 # Upload File
-@app.post("/upload", response_model=schemas.File)
+@router.post("/upload", response_model=schemas.File)
 async def upload_file(
     file: UploadFile = File(...),
+    x_checksum_sha256: Optional[str] = Header(None),
     current_user: schemas.User = Depends(get_current_user),
     db: Session = Depends(get_db),
+    settings: Settings = Depends(get_app_settings),
+    file_cache: FileCache = Depends(get_file_cache),
+    transfer_limiter: TransferLimiter = Depends(get_transfer_limiter),
 ):
-    user_dir = os.path.join(FILE_STORAGE, current_user.username)
+    check_filename(file.filename)
+    user_dir = os.path.join(settings.file_storage, current_user.username)
     os.makedirs(user_dir, exist_ok=True)
     file_path = os.path.join(user_dir, file.filename)
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    file_create = schemas.FileCreate(filename=file.filename)
-    # Create file entry in the database
-    new_file = crud.create_file(db=db, file=file_create, user_id=current_user.id)
+    tmp_path = os.path.join(settings.file_storage, UPLOAD_TMP_DIR, uuid.uuid4().hex)
+    slot = acquire_transfer_slot(transfer_limiter, current_user.id)
+    size = 0
+    file_hash = new_hash()
+    try:
+        with open(tmp_path, "wb") as buffer:
+            while chunk := await file.read(settings.transfer_chunk_size):
+                await slot.throttle(len(chunk))
+                await run_in_threadpool(write_chunk, buffer, file_hash, chunk)
+                size += len(chunk)
+            await run_in_threadpool(sync_file, buffer)
+        checksum = file_hash.hexdigest()
+        if x_checksum_sha256 and x_checksum_sha256.lower() != checksum:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Checksum mismatch, received content has SHA-256 {checksum}",
+            )
+        os.replace(tmp_path, file_path)
+    finally:
+        slot.release()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    file_cache.invalidate(file_path)
+    existing_file = crud.get_file_by_filename(
+        db=db, filename=file.filename, user_id=current_user.id
+    )
+    storage_delta = size
+    if existing_file:
+        storage_delta -= existing_file.size or 0
+        # Overwriting keeps the existing entry instead of adding a duplicate
+        new_file = crud.update_file_contents(
+            db=db, file=existing_file, size=size, checksum=checksum
+        )
+    else:
+        file_create = schemas.FileCreate(
+            filename=file.filename, size=size, checksum=checksum
+        )
+        # Create file entry in the database
+        new_file = crud.create_file(db=db, file=file_create, user_id=current_user.id)
     # Log user activity
     crud.create_user_activity_log(db=db, user_id=current_user.id, action=f"Uploaded file '{file.filename}'")
+    crud.record_usage(
+        db=db,
+        user_id=current_user.id,
+        uploads=1,
+        bytes_in=size,
+        storage_delta=storage_delta,
+    )
     return new_file
 
 # Download File
-@app.get("/download/{filename}")
+@router.get("/download/{filename}")
 async def download_file(
-    filename: str, current_user: schemas.User = Depends(get_current_user),db: Session = Depends(get_db)
+    filename: str,
+    current_user: schemas.User = Depends(get_current_user),
+    db: Session = Depends(get_db),
+    settings: Settings = Depends(get_app_settings),
+    file_cache: FileCache = Depends(get_file_cache),
+    transfer_limiter: TransferLimiter = Depends(get_transfer_limiter),
 ):
-    user_dir = os.path.join(FILE_STORAGE, current_user.username)
+    user_dir = os.path.join(settings.file_storage, current_user.username)
     file_path = os.path.join(user_dir, filename)
-    if os.path.exists(file_path):
+    # Take the slot first so a rejected request does not read the file
+    slot = acquire_transfer_slot(transfer_limiter, current_user.id)
+    try:
+        cached = None
+        if file_cache.enabled:
+            cached = file_cache.get(file_path) or file_cache.load(file_path)
+        try:
+            size = cached.size if cached is not None else os.path.getsize(file_path)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="File not found")
+        db_file = crud.get_file_by_filename(db=db, filename=filename, user_id=current_user.id)
+        headers = {}
+        if db_file is not None and db_file.checksum:
+            headers["Digest"] = digest_header(db_file.checksum)
         # Log user activity
         crud.create_user_activity_log(db=db, user_id=current_user.id, action=f"Downloaded file '{filename}'")
-        return FileResponse(file_path)
-    else:
-        raise HTTPException(status_code=404, detail="File not found")
+        crud.record_usage(db=db, user_id=current_user.id, downloads=1, bytes_out=size)
+    except Exception:
+        slot.release()
+        raise
+    if cached is not None:
+        try:
+            await slot.throttle(cached.size)
+        finally:
+            slot.release()
+        return Response(
+            content=cached.content,
+            media_type=cached.media_type,
+            headers={**headers, "ETag": cached.etag},
+        )
+    if transfer_limiter.rate_limited:
+        return StreamingResponse(
+            iter_file(file_path, slot, settings.transfer_chunk_size),
+            media_type=mimetypes.guess_type(file_path)[0] or "text/plain",
+            headers={**headers, "Content-Length": str(size)},
+            background=BackgroundTask(slot.release),
+        )
+    return FileResponse(
+        file_path, headers=headers, background=BackgroundTask(slot.release)
+    )
 
 
-@app.get("/filespace", response_model=schemas.Filespace)
+@router.get("/cache/stats")
+async def cache_stats(
+    current_user: schemas.User = Depends(get_current_user),
+    file_cache: FileCache = Depends(get_file_cache),
+):
+    return file_cache.stats()
+
+
+@router.get("/filespace", response_model=schemas.Filespace)
 async def check_filespace(
     current_user: schemas.User = Depends(get_current_user),
     db: Session = Depends(get_db),
+    settings: Settings = Depends(get_app_settings),
 ):
     files = crud.get_files(db=db, user_id=current_user.id)
-    total_size = sum(
-        os.path.getsize(os.path.join(FILE_STORAGE, current_user.username, f))
-        for f in files
-    )
+    user_dir = os.path.join(settings.file_storage, current_user.username)
+    total_size = 0
+    for f in files:
+        try:
+            total_size += os.path.getsize(os.path.join(user_dir, f))
+        except FileNotFoundError:
+            # Missing blob, not counted
+            continue
     return {"files": files, "total_size": total_size}
 
 
 # Update User Information
-@app.put("/users/{user_id}")
+@router.put("/users/{user_id}")
 def update_user_info(
     user_id: int,
     updated_info: schemas.UserUpdate,
@@ -216,7 +448,7 @@ def update_user_info(
 
 
 # Change Password
-@app.put("/users/{user_id}/change-password")
+@router.put("/users/{user_id}/change-password")
 def change_password(
     user_id: int,
     password_data: schemas.PasswordChange,
@@ -233,49 +465,93 @@ def change_password(
 
 
 # Delete Account
-@app.delete("/users/{user_id}")
+@router.delete("/users/{user_id}")
 def delete_account(
     user_id: int,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(get_current_user),
+    settings: Settings = Depends(get_app_settings),
+    file_cache: FileCache = Depends(get_file_cache),
+    deletion_manager: DeletionManager = Depends(get_deletion_manager),
 ):
-    success = crud.delete_user(db=db, user_id=user_id)
-    if success:
-        # Log user activity
+    user = crud.delete_user(db=db, user_id=user_id)
+    if user:
+        # Log user activity before the job starts purging the user's rows
         crud.create_user_activity_log(db=db, user_id=current_user.id, action="Deleted account")
-        return {"message": "User deleted successfully"}
+        job = deletion_manager.delete_user(user, requested_by=current_user.id)
+        file_cache.invalidate_prefix(os.path.join(settings.file_storage, user.username))
+        return {"message": "User deletion scheduled", "job_id": job.id}
     else:
         raise HTTPException(status_code=404, detail="User not found")
 
 
 # Delete File
-@app.delete("/files/{file_id}")
+@router.delete("/files/{file_id}")
 def delete_file(
     file_id: int,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(get_current_user),
+    settings: Settings = Depends(get_app_settings),
+    file_cache: FileCache = Depends(get_file_cache),
+    deletion_manager: DeletionManager = Depends(get_deletion_manager),
 ):
-    success = crud.delete_file(db=db, file_id=file_id, user_id=current_user.id)
-    if success:
+    file = crud.delete_file(db=db, file_id=file_id, user_id=current_user.id)
+    if file:
+        job = deletion_manager.delete_file(file, requested_by=current_user.id)
+        crud.record_usage(db=db, user_id=current_user.id, storage_delta=-(file.size or 0))
+        file_cache.invalidate(os.path.join(settings.file_storage, current_user.username, file.filename))
         # Log user activity
         crud.create_user_activity_log(db=db, user_id=current_user.id, action="Deleted file")
-        return {"message": "File deleted successfully"}
+        return {"message": "File deletion scheduled", "job_id": job.id}
     else:
         raise HTTPException(status_code=404, detail="File not found")
 
 
+# Deletion Progress
+@router.get("/deletions/{job_id}")
+def deletion_status(
+    job_id: str,
+    current_user: schemas.User = Depends(get_current_user),
+    deletion_manager: DeletionManager = Depends(get_deletion_manager),
+):
+    job = deletion_manager.get(job_id, requested_by=current_user.id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+    return job
+
+
 # Rename File
-@app.put("/files/{file_id}")
+@router.put("/files/{file_id}", response_model=schemas.File)
 def rename_file(
     file_id: int,
     new_filename: str,
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(get_current_user),
+    settings: Settings = Depends(get_app_settings),
+    file_cache: FileCache = Depends(get_file_cache),
 ):
+    check_filename(new_filename)
+    old_file = crud.get_file(db=db, file_id=file_id, user_id=current_user.id)
+    if old_file is None:
+        raise HTTPException(status_code=404, detail="File not found")
+    old_filename = old_file.filename
+    user_dir = os.path.join(settings.file_storage, current_user.username)
+    old_path = os.path.join(user_dir, old_filename)
+    new_path = os.path.join(user_dir, new_filename)
+    if new_filename != old_filename and (
+        crud.get_file_by_filename(db=db, filename=new_filename, user_id=current_user.id)
+        or os.path.exists(new_path)
+    ):
+        # Renaming never replaces another file's content
+        raise HTTPException(status_code=409, detail="A file with this name already exists")
     file = crud.rename_file(
         db=db, file_id=file_id, new_filename=new_filename, user_id=current_user.id
     )
     if file:
+        if os.path.exists(old_path):
+            os.replace(old_path, new_path)
+        file_cache.invalidate(old_path)
+        file_cache.invalidate(new_path)
         # Log user activity
         crud.create_user_activity_log(db=db, user_id=current_user.id, action=f"Renamed file '{new_filename}'")
         return file
@@ -283,7 +559,7 @@ def rename_file(
         raise HTTPException(status_code=404, detail="File not found")
 
 # Search Files
-@app.get("/files/search")
+@router.get("/files/search")
 def search_files(
     query: str,
     db: Session = Depends(get_db),
@@ -294,7 +570,7 @@ def search_files(
 
 
 # Filter Files
-@app.get("/files/filter")
+@router.get("/files/filter")
 def filter_files(
     file_type: Optional[str] = None,
     min_size: Optional[int] = None,
@@ -317,7 +593,7 @@ def filter_files(
 
 
 # View File History
-@app.get("/files/{file_id}/history")
+@router.get("/files/{file_id}/history")
 def view_file_history(
     file_id: int,
     db: Session = Depends(get_db),
@@ -328,7 +604,7 @@ def view_file_history(
 
 
 # User Activity Log
-@app.get("/users/me/activity-log")
+@router.get("/users/me/activity-log")
 def user_activity_log(
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(get_current_user),
@@ -338,7 +614,7 @@ def user_activity_log(
 
 
 # Usage Statistics
-@app.get("/statistics")
+@router.get("/statistics")
 def usage_statistics(
     db: Session = Depends(get_db),
     current_user: schemas.User = Depends(get_current_user),
@@ -347,15 +623,31 @@ def usage_statistics(
     return statistics
 
 
-# # Generate Reports
-# @app.get("/reports")
-# def generate_reports(
-#     start_date: Optional[datetime] = None,
-#     end_date: Optional[datetime] = None,
-#     db: Session = Depends(get_db),
-#     current_user: schemas.User = Depends(get_current_user),
-# ):
-#     reports = crud.generate_reports(
-#         db=db, start_date=start_date, end_date=end_date, user_id=current_user.id
-#     )
-#     return reports
+# Generate Reports
+@router.get("/reports")
+def generate_reports(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    format: str = "json",
+    db: Session = Depends(get_db),
+    current_user: schemas.User = Depends(get_current_user),
+):
+    if format not in ("json", "csv"):
+        raise HTTPException(status_code=400, detail="Format must be 'json' or 'csv'")
+    reports = crud.generate_reports(
+        db=db, start_date=start_date, end_date=end_date, user_id=current_user.id
+    )
+    if format == "csv":
+        output = io.StringIO()
+        writer = csv.DictWriter(
+            output,
+            fieldnames=["day", "uploads", "downloads", "bytes_in", "bytes_out", "storage_used"],
+        )
+        writer.writeheader()
+        writer.writerows(reports)
+        return Response(
+            content=output.getvalue(),
+            media_type="text/csv",
+            headers={"Content-Disposition": 'attachment; filename="report.csv"'},
+        )
+    return reports
@@ -0,0 +1,92 @@
+"""Create or upgrade the database schema.
+
+Run from the backend directory before starting the server::
+
+    python -m app.migrate
+
+Missing tables are created. Columns and indexes added to existing models are
+added to existing tables. Files without a recorded size (uploaded before
+sizes were stored) get it from their blob in FILE_STORAGE. When the usage
+rollups are created on a database that already has files, they are seeded
+with each user's current storage.
+"""
+import os
+from datetime import datetime
+
+from sqlalchemy import func, inspect, literal, select, text
+
+from . import models
+from .config import get_settings
+from .database import Base, engine
+
+
+def add_column(conn, table, column):
+    ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=conn.dialect)}"
+    if column.default is not None and column.default.is_scalar:
+        default = column.default.arg
+        ddl += f" DEFAULT {int(default) if isinstance(default, bool) else repr(default)}"
+    conn.execute(text(ddl))
+
+
+def backfill_sizes(conn, storage, batch_size=500):
+    files = models.File.__table__
+    users = models.User.__table__
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            select(files.c.id, files.c.filename, users.c.username)
+            .join(users, files.c.owner_id == users.c.id)
+            .where(files.c.id > last_id, files.c.size.is_(None))
+            .order_by(files.c.id)
+            .limit(batch_size)
+        ).all()
+        if not rows:
+            return
+        for row in rows:
+            try:
+                size = os.stat(os.path.join(storage, row.username, row.filename)).st_size
+            except FileNotFoundError:
+                # Missing blob, the size stays unknown
+                continue
+            conn.execute(files.update().where(files.c.id == row.id).values(size=size))
+        last_id = rows[-1].id
+
+
+def backfill_usage(conn):
+    usage = models.UsageDaily.__table__
+    files = models.File.__table__
+    storage = select(
+        files.c.owner_id,
+        literal(datetime.utcnow().date()),
+        func.coalesce(func.sum(files.c.size), 0),
+    ).group_by(files.c.owner_id)
+    conn.execute(
+        usage.insert().from_select(["user_id", "day", "storage_delta"], storage)
+    )
+
+
+def upgrade(bind=engine, storage=None):
+    storage = storage or get_settings().file_storage
+    existing_tables = set(inspect(bind).get_table_names())
+    Base.metadata.create_all(bind=bind)
+    with bind.begin() as conn:
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            columns = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in columns:
+                    print(f"Adding column {table.name}.{column.name}")
+                    add_column(conn, table, column)
+            for index in table.indexes:
+                index.create(conn, checkfirst=True)
+        if "files" in existing_tables:
+            backfill_sizes(conn, storage)
+        if "files" in existing_tables and "usage_daily" not in existing_tables:
+            print("Seeding usage rollups")
+            backfill_usage(conn)
+
+
+if __name__ == "__main__":
+    upgrade()
@@ -1,4 +1,14 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    Date,
+    DateTime,
+    ForeignKey,
+    Integer,
+    String,
+    UniqueConstraint,
+)
 from sqlalchemy.orm import relationship
 from .database import Base
 
@@ -12,6 +22,7 @@ class User(Base):
     full_name = Column(String, index=True)
     hashed_password = Column(String)
     disabled = Column(Boolean, default=False)
+    pending_delete = Column(Boolean, default=False, index=True)
 
     files = relationship("File", back_populates="owner")
     file_history = relationship("FileHistory", back_populates="user")
@@ -23,7 +34,14 @@ class File(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     filename = Column(String, index=True)
+    size = Column(Integer)
+    # Hex SHA-256 of the content, see integrity.py
+    checksum = Column(String)
+    checksum_verified_at = Column(DateTime)
+    # Set when the scrubber first finds the blob does not match the checksum
+    checksum_failed_at = Column(DateTime)
     owner_id = Column(Integer, ForeignKey("users.id"))
+    pending_delete = Column(Boolean, default=False, index=True)
 
     owner = relationship("User", back_populates="files")
     history = relationship("FileHistory", back_populates="file")
@@ -50,3 +68,23 @@ class UserActivityLog(Base):
     timestamp = Column(DateTime)
 
     user = relationship("User", back_populates="user_activity_log")
+
+
+class UsageDaily(Base):
+    """Per-user daily usage rollup, updated as transfers happen.
+
+    ``storage_delta`` is the net change in stored bytes that day, so the
+    storage used at the end of a day is the sum of all deltas up to it.
+    """
+
+    __tablename__ = "usage_daily"
+    __table_args__ = (UniqueConstraint("user_id", "day"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), index=True)
+    day = Column(Date, index=True)
+    uploads = Column(Integer, default=0, nullable=False)
+    downloads = Column(Integer, default=0, nullable=False)
+    bytes_in = Column(BigInteger, default=0, nullable=False)
+    bytes_out = Column(BigInteger, default=0, nullable=False)
+    storage_delta = Column(BigInteger, default=0, nullable=False)
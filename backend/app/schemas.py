@@ -28,12 +28,15 @@ class FileBase(BaseModel):
 
 
 class FileCreate(FileBase):
-    pass
+    size: Optional[int] = None
+    checksum: Optional[str] = None
 
 
 class File(FileBase):
     id: int
     owner_id: int
+    size: Optional[int] = None
+    checksum: Optional[str] = None
 
     class Config:
         orm_mode = True
@@ -0,0 +1,155 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Optional
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations instead of blocking.
+
+    ``reserve`` always succeeds and returns how long the caller has to wait
+    before using the tokens, which lets the same bucket back both async and
+    blocking callers. A rate of 0 means unlimited.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill()
+            self.rate = rate
+            self.capacity = rate
+            self.tokens = min(self.tokens, self.capacity)
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.rate:
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+        self.updated = now
+
+    def full(self) -> bool:
+        with self._lock:
+            self._refill()
+            return self.tokens >= self.capacity
+
+    def reserve(self, amount: int) -> float:
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+
+class TransferSlot:
+    def __init__(self, limiter: "TransferLimiter", user_id: int):
+        self.limiter = limiter
+        self.user_id = user_id
+        self.released = False
+
+    async def throttle(self, amount: int):
+        await self.limiter.throttle(self.user_id, amount)
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.limiter.release(self.user_id)
+
+
+class TooManyTransfers(Exception):
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+
+
+class TransferLimiter:
+    """Per-user and global admission control and bandwidth limits for transfers.
+
+    The global byte rate is shared fairly between the users that currently
+    have a transfer in flight: each of them is limited to
+    ``min(user_rate, global_rate / active_users)``, so a user running many
+    parallel transfers only splits their own share between them.
+
+    A user's bucket outlives their transfers until it has refilled, so
+    back-to-back transfers are paced as one stream instead of each starting
+    with a full burst.
+    """
+
+    def __init__(
+        self,
+        user_rate: int = 0,
+        global_rate: int = 0,
+        user_concurrency: int = 0,
+        global_concurrency: int = 0,
+        retry_after: int = 1,
+    ):
+        self.user_rate = user_rate
+        self.global_rate = global_rate
+        self.user_concurrency = user_concurrency
+        self.global_concurrency = global_concurrency
+        self.retry_after = retry_after
+        self.global_bucket = TokenBucket(global_rate)
+        self.active: Dict[int, int] = {}
+        self.total_active = 0
+        self._buckets: Dict[int, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def rate_limited(self) -> bool:
+        return bool(self.user_rate or self.global_rate)
+
+    def acquire(self, user_id: int) -> TransferSlot:
+        """Reserve a transfer slot or raise ``TooManyTransfers``."""
+        with self._lock:
+            if self.global_concurrency and self.total_active >= self.global_concurrency:
+                raise TooManyTransfers(self.retry_after)
+            if self.user_concurrency and self.active.get(user_id, 0) >= self.user_concurrency:
+                raise TooManyTransfers(self.retry_after)
+            self.active[user_id] = self.active.get(user_id, 0) + 1
+            self.total_active += 1
+            self._prune()
+            if user_id not in self._buckets:
+                self._buckets[user_id] = TokenBucket(self._user_share())
+            self._rebalance()
+        return TransferSlot(self, user_id)
+
+    def release(self, user_id: int):
+        with self._lock:
+            self.active[user_id] -= 1
+            self.total_active -= 1
+            if self.active[user_id] <= 0:
+                del self.active[user_id]
+            self._rebalance()
+
+    def _user_share(self) -> float:
+        share = self.user_rate
+        if self.global_rate and self.active:
+            fair_share = self.global_rate / len(self.active)
+            share = min(share, fair_share) if share else fair_share
+        return share
+
+    def _prune(self):
+        # Drop the buckets of idle users that have refilled, a new one would
+        # start out the same
+        for user_id in list(self._buckets):
+            if user_id not in self.active and self._buckets[user_id].full():
+                del self._buckets[user_id]
+
+    def _rebalance(self):
+        # Idle buckets keep refilling at the rate they were drained at
+        share = self._user_share()
+        for user_id in self.active:
+            self._buckets[user_id].set_rate(share)
+
+    async def throttle(self, user_id: int, amount: int):
+        bucket = self._buckets.get(user_id)
+        delay = bucket.reserve(amount) if bucket is not None else 0.0
+        delay = max(delay, self.global_bucket.reserve(amount))
+        if delay:
+            await asyncio.sleep(delay)
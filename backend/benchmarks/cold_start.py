@@ -0,0 +1,92 @@
+"""Measure backend cold-start time.
+
+Each run starts a fresh interpreter and times importing ``app.main``,
+building the app with ``create_app`` and running its startup, against a
+migrated SQLite database in a temporary directory::
+
+    python benchmarks/cold_start.py --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RUN = """
+import asyncio, json, time
+start = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+application = app.main.create_app()
+created = time.perf_counter()
+
+async def startup():
+    async with application.router.lifespan_context(application):
+        pass
+
+asyncio.run(startup())
+started = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "create_app": created - imported,
+    "startup": started - created,
+    "total": started - start,
+}))
+"""
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure backend cold-start time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--no-admin", action="store_true", help="disable SQLAdmin")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        env = dict(
+            os.environ,
+            PYTHONPATH=BACKEND_DIR,
+            FILE_STORAGE=os.path.join(workdir, "storage"),
+            DEFAULT_USER_USERNAME="benchmark",
+            DEFAULT_USER_PASSWORD="benchmark",
+        )
+        if args.no_admin:
+            env["ENABLE_ADMIN"] = "false"
+        subprocess.run(
+            [sys.executable, "-m", "app.migrate"], cwd=workdir, env=env, check=True
+        )
+        # The first run creates the default user, the measured ones find it
+        subprocess.run(
+            [sys.executable, "-c", RUN],
+            cwd=workdir,
+            env=env,
+            check=True,
+            capture_output=True,
+        )
+        timings = [
+            json.loads(
+                subprocess.run(
+                    [sys.executable, "-c", RUN],
+                    cwd=workdir,
+                    env=env,
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout
+            )
+            for _ in range(args.runs)
+        ]
+
+    for phase in ["import", "create_app", "startup", "total"]:
+        values = [timing[phase] * 1000 for timing in timings]
+        print(
+            f"{phase:>10}: median {statistics.median(values):7.1f} ms"
+            f"  min {min(values):7.1f} ms  max {max(values):7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,10 @@ import os
 
 import requests
 import streamlit as st
+from requests.adapters import HTTPAdapter
+from requests_toolbelt import MultipartEncoder, MultipartEncoderMonitor
 
-API_URL = "http://backend:8000"
+API_URL = os.getenv("API_URL", "http://backend:8000")
 
 st.title("File Management App")
 
@@ -12,11 +14,32 @@ if "token" not in st.session_state:
 # Initialize session state if not already initialized
 if "username" not in st.session_state:
     st.session_state.username = None
+# Cached /filespace response, reset to None to fetch it again
+if "filespace" not in st.session_state:
+    st.session_state.filespace = None
+if "uploaded_file_id" not in st.session_state:
+    st.session_state.uploaded_file_id = None
+
+
+def get_http():
+    # One pooled HTTP session per browser session, reused across reruns
+    if "http" not in st.session_state:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        st.session_state.http = session
+    return st.session_state.http
+
+
+def auth_headers():
+    return {"Authorization": f"Bearer {st.session_state.token}"}
 
 
 def login():
     st.session_state.token = (
-        requests.post(
+        get_http()
+        .post(
             f"{API_URL}/token",
             data={
                 "username": st.session_state.username,
@@ -26,10 +49,55 @@ def login():
         .json()
         .get("access_token")
     )
+    st.session_state.filespace = None
 
 
 def logout():
     st.session_state.token = None
+    st.session_state.filespace = None
+
+
+def invalidate_filespace():
+    st.session_state.filespace = None
+
+
+def upload(uploaded_file):
+    # Stream the multipart body from the uploaded file instead of building it
+    # in memory, and report progress as it is sent
+    progress = st.progress(0.0, text="Uploading...")
+    encoder = MultipartEncoder(
+        fields={
+            "file": (
+                uploaded_file.name,
+                uploaded_file,
+                uploaded_file.type or "application/octet-stream",
+            )
+        }
+    )
+    last_percent = [0]
+
+    def on_read(monitor):
+        percent = min(100, monitor.bytes_read * 100 // monitor.len)
+        if percent > last_percent[0]:
+            last_percent[0] = percent
+            progress.progress(percent / 100, text="Uploading...")
+
+    monitor = MultipartEncoderMonitor(encoder, on_read)
+    response = get_http().post(
+        f"{API_URL}/upload",
+        headers={**auth_headers(), "Content-Type": monitor.content_type},
+        data=monitor,
+    )
+    progress.empty()
+    invalidate_filespace()
+    return response
+
+
+def get_filespace():
+    if st.session_state.filespace is None:
+        response = get_http().get(f"{API_URL}/filespace", headers=auth_headers())
+        st.session_state.filespace = response.json()
+    return st.session_state.filespace
 
 
 if st.session_state.token:
@@ -38,21 +106,19 @@ if st.session_state.token:
 
     st.subheader("Upload a file")
     uploaded_file = st.file_uploader("Choose a file")
-    if uploaded_file is not None:
-        files = {"file": uploaded_file.getvalue()}
-        response = requests.post(
-            f"{API_URL}/upload",
-            headers={"Authorization": f"Bearer {st.session_state.token}"},
-            files=files,
-        )
+    # Streamlit reruns the script on every interaction, only upload a newly
+    # selected file once
+    if (
+        uploaded_file is not None
+        and uploaded_file.file_id != st.session_state.uploaded_file_id
+    ):
+        response = upload(uploaded_file)
+        st.session_state.uploaded_file_id = uploaded_file.file_id
         st.write(response.json())
 
     st.subheader("Check available files and space")
-    response = requests.get(
-        f"{API_URL}/filespace",
-        headers={"Authorization": f"Bearer {st.session_state.token}"},
-    )
-    data = response.json()
+    st.button("Refresh", on_click=invalidate_filespace)
+    data = get_filespace()
     st.write("Files:", data["files"])
     st.write("Total size:", data["total_size"], "bytes")
 else:
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+# Make the backend `app` package importable for the unit tests
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(__file__)), "backend"))
+
+from app import deletion, fsck, integrity  # noqa: E402
+from app.database import Base  # noqa: E402
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    """A fresh SQLite database used by the background jobs instead of test.db."""
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'test.db'}", connect_args={"check_same_thread": False}
+    )
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    for module in (deletion, fsck, integrity):
+        monkeypatch.setattr(module, "SessionLocal", factory)
+    return factory
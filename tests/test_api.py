@@ -1,5 +1,8 @@
+import base64
+import hashlib
 import os
 import shutil
+import time
 
 import pytest
 import requests
@@ -48,6 +51,17 @@ def test_create_user(access_token):
     assert response.status_code == 400
 
 
+@pytest.mark.parametrize("username", [".trash", ".uploads", "a/b", ".."])
+def test_create_user_rejects_unsafe_username(username):
+    user_data = {
+        "username": username,
+        "password": "new_password",
+        "email": f"{len(username)}@example.com",
+    }
+    response = requests.post(f"{API_URL}/users/", json=user_data)
+    assert response.status_code == 400
+
+
 @pytest.mark.dependency()
 def test_upload_file(access_token):
     # Upload a file
@@ -87,3 +101,162 @@ def test_check_filespace(access_token):
     assert response.status_code == 200
     assert "files" in response.json()
     assert "total_size" in response.json()
+
+
+def test_download_served_from_cache(access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    files = {"file": ("cached_file.txt", "First version")}
+    response = requests.post(f"{API_URL}/upload", files=files, headers=headers)
+    assert response.status_code == 200
+
+    # The first download fills the cache, the second one is served from it
+    response = requests.get(f"{API_URL}/download/cached_file.txt", headers=headers)
+    assert response.status_code == 200
+    hits = requests.get(f"{API_URL}/cache/stats", headers=headers).json()["hits"]
+    response = requests.get(f"{API_URL}/download/cached_file.txt", headers=headers)
+    assert response.status_code == 200
+    assert response.content == b"First version"
+    assert "etag" in response.headers
+    stats = requests.get(f"{API_URL}/cache/stats", headers=headers).json()
+    assert stats["hits"] == hits + 1
+
+    # Overwriting the file invalidates the cached copy
+    files = {"file": ("cached_file.txt", "Second version")}
+    response = requests.post(f"{API_URL}/upload", files=files, headers=headers)
+    assert response.status_code == 200
+    response = requests.get(f"{API_URL}/download/cached_file.txt", headers=headers)
+    assert response.content == b"Second version"
+
+
+def test_rename_file(access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    files = {"file": ("before_rename.txt", "Renamed content")}
+    response = requests.post(f"{API_URL}/upload", files=files, headers=headers)
+    assert response.status_code == 200
+    file_id = response.json()["id"]
+    assert response.json()["size"] == len("Renamed content")
+
+    response = requests.put(
+        f"{API_URL}/files/{file_id}",
+        params={"new_filename": "after_rename.txt"},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert response.json()["id"] == file_id
+    assert response.json()["filename"] == "after_rename.txt"
+
+    # The blob on disk follows the row
+    response = requests.get(f"{API_URL}/download/after_rename.txt", headers=headers)
+    assert response.status_code == 200
+    assert response.content == b"Renamed content"
+    response = requests.get(f"{API_URL}/download/before_rename.txt", headers=headers)
+    assert response.status_code == 404
+
+
+def test_delete_file_in_background(access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    files = {"file": ("to_delete.txt", "Delete me")}
+    response = requests.post(f"{API_URL}/upload", files=files, headers=headers)
+    assert response.status_code == 200
+    file_id = response.json()["id"]
+
+    response = requests.delete(f"{API_URL}/files/{file_id}", headers=headers)
+    assert response.status_code == 200
+    job_id = response.json()["job_id"]
+
+    # The file disappears right away, the job finishes the cleanup later
+    response = requests.get(f"{API_URL}/download/to_delete.txt", headers=headers)
+    assert response.status_code == 404
+    for _ in range(50):
+        job = requests.get(f"{API_URL}/deletions/{job_id}", headers=headers).json()
+        if job["status"] in ("done", "failed"):
+            break
+        time.sleep(0.1)
+    assert job["status"] == "done"
+    assert job["blobs_deleted"] == 1
+
+
+def test_usage_reports(access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    before = requests.get(f"{API_URL}/statistics", headers=headers).json()
+    files = {"file": ("report_file.txt", "12345")}
+    response = requests.post(f"{API_URL}/upload", files=files, headers=headers)
+    assert response.status_code == 200
+    response = requests.get(f"{API_URL}/download/report_file.txt", headers=headers)
+    assert response.status_code == 200
+
+    after = requests.get(f"{API_URL}/statistics", headers=headers).json()
+    assert after["total_uploads"] == before["total_uploads"] + 1
+    assert after["total_downloads"] == before["total_downloads"] + 1
+    assert after["total_bytes_out"] == before["total_bytes_out"] + 5
+
+    response = requests.get(f"{API_URL}/reports", headers=headers)
+    assert response.status_code == 200
+    today = response.json()[-1]
+    assert today["storage_used"] == after["total_storage_used"]
+
+    response = requests.get(
+        f"{API_URL}/reports", params={"format": "csv"}, headers=headers
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    assert response.text.splitlines()[0] == (
+        "day,uploads,downloads,bytes_in,bytes_out,storage_used"
+    )
+
+
+def test_upload_checksum(access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    content = b"Checked content"
+    checksum = hashlib.sha256(content).hexdigest()
+
+    # A wrong expected checksum rejects the upload
+    response = requests.post(
+        f"{API_URL}/upload",
+        files={"file": ("checked_file.txt", content)},
+        headers={**headers, "X-Checksum-SHA256": "0" * 64},
+    )
+    assert response.status_code == 400
+
+    response = requests.post(
+        f"{API_URL}/upload",
+        files={"file": ("checked_file.txt", content)},
+        headers={**headers, "X-Checksum-SHA256": checksum},
+    )
+    assert response.status_code == 200
+    assert response.json()["checksum"] == checksum
+
+    response = requests.get(f"{API_URL}/download/checked_file.txt", headers=headers)
+    assert response.status_code == 200
+    expected = base64.b64encode(hashlib.sha256(content).digest()).decode()
+    assert response.headers["digest"] == f"sha-256={expected}"
+
+
+def test_rename_file_rejects_unsafe_names(access_token):
+    headers = {"Authorization": f"Bearer {access_token}"}
+    file_ids = {}
+    for name in ("rename_a.txt", "rename_b.txt"):
+        files = {"file": (name, f"Content of {name}")}
+        response = requests.post(f"{API_URL}/upload", files=files, headers=headers)
+        assert response.status_code == 200
+        file_ids[name] = response.json()["id"]
+
+    for new_filename in ("../other_user/rename_a.txt", "..", "sub/rename_a.txt"):
+        response = requests.put(
+            f"{API_URL}/files/{file_ids['rename_a.txt']}",
+            params={"new_filename": new_filename},
+            headers=headers,
+        )
+        assert response.status_code == 400
+
+    # Renaming onto an existing file is refused and leaves both files intact
+    response = requests.put(
+        f"{API_URL}/files/{file_ids['rename_a.txt']}",
+        params={"new_filename": "rename_b.txt"},
+        headers=headers,
+    )
+    assert response.status_code == 409
+    response = requests.get(f"{API_URL}/download/rename_b.txt", headers=headers)
+    assert response.content == b"Content of rename_b.txt"
+    response = requests.get(f"{API_URL}/download/rename_a.txt", headers=headers)
+    assert response.content == b"Content of rename_a.txt"
@@ -0,0 +1,79 @@
+from app.cache import CachedFile, FileCache
+
+
+def entry(size):
+    return CachedFile(
+        content=b"x" * size, size=size, etag='"etag"', media_type="text/plain"
+    )
+
+
+def test_lru_byte_budget():
+    cache = FileCache(max_bytes=10, max_file_size=10)
+    cache.put("a", entry(4))
+    cache.put("b", entry(4))
+    # Touching "a" makes "b" the least recently used entry
+    assert cache.get("a") is not None
+    cache.put("c", entry(4))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.current_bytes == 8
+    assert cache.evictions == 1
+
+
+def test_oversized_entries_are_not_cached():
+    cache = FileCache(max_bytes=10, max_file_size=5)
+    cache.put("a", entry(6))
+    assert cache.get("a") is None
+    assert cache.current_bytes == 0
+
+
+def test_max_entries():
+    cache = FileCache(max_bytes=100, max_file_size=10, max_entries=2)
+    for path in ("a", "b", "c"):
+        cache.put(path, entry(1))
+    assert cache.stats()["entries"] == 2
+    assert cache.get("a") is None
+    assert cache.evictions == 1
+
+
+def test_invalidate_prefix():
+    cache = FileCache(max_bytes=100, max_file_size=10)
+    for path in ("/s/alice/a", "/s/alice/b", "/s/alice2/a"):
+        cache.put(path, entry(2))
+    cache.invalidate_prefix("/s/alice")
+    assert cache.get("/s/alice/a") is None and cache.get("/s/alice/b") is None
+    # Only whole path components match
+    assert cache.get("/s/alice2/a") is not None
+    assert cache.current_bytes == 2
+
+
+def test_load_reads_small_files_only(tmp_path):
+    cache = FileCache(max_bytes=100, max_file_size=5)
+    (tmp_path / "small.txt").write_bytes(b"123")
+    (tmp_path / "big.txt").write_bytes(b"123456")
+    assert cache.load(str(tmp_path / "small.txt")).content == b"123"
+    assert cache.get(str(tmp_path / "small.txt")) is not None
+    assert cache.load(str(tmp_path / "big.txt")) is None
+    assert cache.load(str(tmp_path / "missing.txt")) is None
+
+
+def test_invalidate_during_load_is_not_cached(tmp_path):
+    path = str(tmp_path / "a.txt")
+    (tmp_path / "a.txt").write_bytes(b"old")
+    cache = FileCache(max_bytes=100, max_file_size=10)
+    read = cache._read
+
+    def read_then_replace(p):
+        result = read(p)
+        # A rename or delete lands between the read and the put
+        cache.invalidate(p)
+        return result
+
+    cache._read = read_then_replace
+    assert cache.load(path).content == b"old"
+    assert cache.get(path) is None
+    assert cache._loading == {} and cache._generations == {}
+
+    cache._read = read
+    cache.load(path)
+    assert cache.get(path) is not None
@@ -0,0 +1,57 @@
+from app import deletion, models
+
+
+def test_resume_never_moves_live_file(tmp_path, session_factory):
+    storage = tmp_path / "storage"
+    (storage / "alice").mkdir(parents=True)
+    (storage / ".trash").mkdir()
+    db = session_factory()
+    user = models.User(username="alice")
+    db.add(user)
+    db.commit()
+    old = models.File(filename="a.txt", size=3, owner_id=user.id, pending_delete=True)
+    new = models.File(filename="a.txt", size=3, owner_id=user.id)
+    db.add_all([old, new])
+    db.commit()
+    old_id, new_id = old.id, new.id
+    # The old blob was moved to the trash before the restart, and the user
+    # uploaded a new file under the same name since
+    (storage / ".trash" / f"file-{old_id}").write_bytes(b"old")
+    (storage / "alice" / "a.txt").write_bytes(b"new")
+
+    manager = deletion.DeletionManager(str(storage))
+    manager.resume_pending(db)
+    manager._executor.shutdown(wait=True)
+    db.close()
+
+    assert (storage / "alice" / "a.txt").read_bytes() == b"new"
+    assert not (storage / ".trash" / f"file-{old_id}").exists()
+    db = session_factory()
+    try:
+        assert [f.id for f in db.query(models.File)] == [new_id]
+    finally:
+        db.close()
+
+
+def test_jobs_are_private_and_bounded(tmp_path, session_factory):
+    storage = tmp_path / "storage"
+    (storage / "alice").mkdir(parents=True)
+    db = session_factory()
+    user = models.User(username="alice")
+    db.add(user)
+    db.commit()
+    files = [models.File(filename=f"{i}.txt", owner_id=user.id) for i in range(3)]
+    db.add_all(files)
+    db.commit()
+    for file in files:
+        (storage / "alice" / file.filename).write_bytes(b"x")
+
+    manager = deletion.DeletionManager(str(storage), max_finished_jobs=2)
+    jobs = [manager.delete_file(file, requested_by=user.id) for file in files]
+    manager._executor.shutdown(wait=True)
+    db.close()
+
+    assert manager.get(jobs[0].id, requested_by=user.id) is None
+    assert manager.get(jobs[2].id, requested_by=user.id)["status"] == "done"
+    assert manager.get(jobs[2].id, requested_by=user.id + 1) is None
+    assert len(manager.jobs) == 2
@@ -0,0 +1,96 @@
+import json
+import os
+
+import pytest
+
+from app import fsck, models
+
+
+@pytest.fixture
+def storage(tmp_path, session_factory):
+    """One user with a healthy file, a dangling row, a resized blob and an orphan."""
+    storage = tmp_path / "storage"
+    user_dir = storage / "alice"
+    user_dir.mkdir(parents=True)
+    (user_dir / "ok.txt").write_bytes(b"12345")
+    (user_dir / "resized.txt").write_bytes(b"1234567")
+    (user_dir / "orphan.txt").write_bytes(b"123")
+
+    db = session_factory()
+    user = models.User(username="alice")
+    db.add(user)
+    db.commit()
+    for filename, size in [("ok.txt", 5), ("missing.txt", 4), ("resized.txt", 2)]:
+        db.add(models.File(filename=filename, size=size, owner_id=user.id))
+    db.commit()
+    db.close()
+    return storage
+
+
+def filenames(session_factory):
+    db = session_factory()
+    try:
+        return {f.filename: f.size for f in db.query(models.File)}
+    finally:
+        db.close()
+
+
+def test_check_reports_issues(storage, session_factory):
+    counts = fsck.Checker(str(storage), batch_size=1).run()
+    assert counts == {"dangling_row": 1, "size_mismatch": 1, "orphaned_blob": 1}
+    # Without --repair nothing changes
+    assert filenames(session_factory) == {
+        "ok.txt": 5,
+        "missing.txt": 4,
+        "resized.txt": 2,
+    }
+
+
+def test_repair(storage, session_factory):
+    fsck.Checker(str(storage), repair=True).run()
+    assert filenames(session_factory) == {
+        "ok.txt": 5,
+        "resized.txt": 7,
+        "orphan.txt": 3,
+    }
+    assert fsck.Checker(str(storage)).run() == {}
+
+    # Storage in the usage rollups follows the repairs: -4 + 5 + 3
+    db = session_factory()
+    try:
+        assert sum(row.storage_delta for row in db.query(models.UsageDaily)) == 4
+    finally:
+        db.close()
+
+
+def test_resume_from_state_file(storage, session_factory, tmp_path):
+    state_file = tmp_path / "fsck.json"
+    # Stopped in the rows pass after the row of missing.txt (id 2)
+    state_file.write_text(
+        json.dumps({"phase": "rows", "last_id": 2, "counts": {"dangling_row": 1}})
+    )
+
+    counts = fsck.Checker(str(storage), state_file=str(state_file)).run()
+    assert counts == {"dangling_row": 1, "size_mismatch": 1, "orphaned_blob": 1}
+    assert json.loads(state_file.read_text())["phase"] == "done"
+
+    # A finished run is not repeated
+    assert fsck.Checker(str(storage), state_file=str(state_file)).state["phase"] == "done"
+
+
+def test_skips_users_pending_deletion(storage, session_factory):
+    db = session_factory()
+    db.query(models.User).update({models.User.pending_delete: True})
+    db.commit()
+    db.close()
+    # The deletion job moved the directory to the trash already
+    (storage / ".trash").mkdir()
+    os.rename(storage / "alice", storage / ".trash" / "user-1")
+
+    assert fsck.Checker(str(storage), repair=True).run() == {}
+    assert len(filenames(session_factory)) == 3
+    db = session_factory()
+    try:
+        assert db.query(models.UsageDaily).count() == 0
+    finally:
+        db.close()
@@ -0,0 +1,59 @@
+import threading
+
+from app import crud, integrity, models
+
+
+def test_corrupt_file_is_reported_once(tmp_path, session_factory):
+    user_dir = tmp_path / "alice"
+    user_dir.mkdir()
+    (user_dir / "a.txt").write_bytes(b"corrupted")
+
+    db = session_factory()
+    user = models.User(username="alice")
+    db.add(user)
+    db.commit()
+    checksum = integrity.new_hash()
+    checksum.update(b"original")
+    db.add(
+        models.File(
+            filename="a.txt", size=8, checksum=checksum.hexdigest(), owner_id=user.id
+        )
+    )
+    db.commit()
+    db.close()
+
+    scrubber = integrity.Scrubber(str(tmp_path))
+    scrubber.run_pass()
+    scrubber.run_pass()
+
+    db = session_factory()
+    file = db.query(models.File).one()
+    assert scrubber.corrupt == 2
+    assert file.checksum_failed_at is not None
+    assert db.query(models.UserActivityLog).count() == 1
+
+    # Uploading the file again clears the failure
+    new_checksum = integrity.file_checksum(str(user_dir / "a.txt"))
+    crud.update_file_contents(db, file, size=9, checksum=new_checksum)
+    assert file.checksum_failed_at is None
+    db.close()
+    scrubber.run_pass()
+    assert scrubber.verified == 1
+
+
+def test_scrubber_survives_failed_pass(monkeypatch):
+    passes = []
+    done = threading.Event()
+
+    def run_pass(self, stop):
+        passes.append(1)
+        if len(passes) == 1:
+            raise RuntimeError("database is locked")
+        done.set()
+
+    monkeypatch.setattr(integrity.Scrubber, "run_pass", run_pass)
+    stop = integrity.start_scrubber("unused", rate=0, interval=0.01)
+    try:
+        assert done.wait(5)
+    finally:
+        stop.set()
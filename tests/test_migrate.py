@@ -0,0 +1,96 @@
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    create_engine,
+    inspect,
+    select,
+)
+
+from app import migrate, models
+from app.database import Base
+
+
+def legacy_schema(engine):
+    """Create the schema as it was before sizes, checksums and rollups existed."""
+    metadata = MetaData()
+    users = Table(
+        "users",
+        metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("username", String, unique=True, index=True),
+        Column("email", String, unique=True, index=True),
+        Column("full_name", String, index=True),
+        Column("hashed_password", String),
+        Column("disabled", Boolean, default=False),
+    )
+    files = Table(
+        "files",
+        metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("filename", String, index=True),
+        Column("owner_id", Integer, ForeignKey("users.id")),
+    )
+    Table(
+        "file_history",
+        metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("file_id", Integer, ForeignKey("files.id")),
+        Column("user_id", Integer, ForeignKey("users.id")),
+        Column("action", String),
+        Column("timestamp", DateTime),
+    )
+    Table(
+        "user_activity_log",
+        metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("user_id", Integer, ForeignKey("users.id")),
+        Column("action", String),
+        Column("timestamp", DateTime),
+    )
+    metadata.create_all(bind=engine)
+    return users, files
+
+
+def test_upgrade_adds_columns_and_backfills_usage(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'migrate.db'}")
+    users, files = legacy_schema(engine)
+    with engine.begin() as conn:
+        conn.execute(users.insert().values(id=1, username="alice"))
+        conn.execute(
+            files.insert(),
+            [
+                {"id": 1, "filename": "a.txt", "owner_id": 1},
+                {"id": 2, "filename": "b.txt", "owner_id": 1},
+                {"id": 3, "filename": "missing.txt", "owner_id": 1},
+            ],
+        )
+    user_dir = tmp_path / "storage" / "alice"
+    user_dir.mkdir(parents=True)
+    (user_dir / "a.txt").write_bytes(b"12345")
+    (user_dir / "b.txt").write_bytes(b"123")
+
+    migrate.upgrade(bind=engine, storage=str(tmp_path / "storage"))
+
+    inspector = inspect(engine)
+    for table in Base.metadata.sorted_tables:
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        assert columns == {column.name for column in table.columns}
+        indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+        assert {index.name for index in table.indexes} <= indexes
+
+    files = models.File.__table__
+    with engine.connect() as conn:
+        sizes = dict(conn.execute(select(files.c.filename, files.c.size)).all())
+        pending = conn.execute(select(files.c.pending_delete)).scalars().all()
+        storage = conn.execute(
+            select(models.UsageDaily.__table__.c.storage_delta)
+        ).scalar_one()
+    assert sizes == {"a.txt": 5, "b.txt": 3, "missing.txt": None}
+    assert pending == [False, False, False]
+    assert storage == 8
@@ -0,0 +1,105 @@
+import pytest
+
+from app.throttle import TooManyTransfers, TransferLimiter
+
+
+def test_user_concurrency_cap():
+    limiter = TransferLimiter(user_concurrency=2, retry_after=3)
+    limiter.acquire(1)
+    limiter.acquire(1)
+    with pytest.raises(TooManyTransfers) as excinfo:
+        limiter.acquire(1)
+    assert excinfo.value.retry_after == 3
+
+    # Other users are not affected by user 1's cap
+    limiter.acquire(2)
+    assert limiter.total_active == 3
+
+
+def test_global_concurrency_cap():
+    limiter = TransferLimiter(global_concurrency=2)
+    limiter.acquire(1)
+    slot = limiter.acquire(2)
+    with pytest.raises(TooManyTransfers):
+        limiter.acquire(3)
+
+    slot.release()
+    limiter.acquire(3)
+    assert limiter.total_active == 2
+
+
+def test_rejected_acquire_does_not_count_as_active():
+    limiter = TransferLimiter(user_concurrency=1, global_rate=1000)
+    limiter.acquire(1)
+    with pytest.raises(TooManyTransfers):
+        limiter.acquire(1)
+    assert limiter.active == {1: 1}
+    assert limiter._buckets[1].rate == 1000
+
+
+def test_fair_share_rebalance():
+    limiter = TransferLimiter(global_rate=1200)
+    first = limiter.acquire(1)
+    assert limiter._buckets[1].rate == 1200
+
+    # Parallel transfers from one user do not increase their share
+    limiter.acquire(1)
+    assert limiter._buckets[1].rate == 1200
+
+    limiter.acquire(2)
+    third = limiter.acquire(3)
+    assert [limiter._buckets[u].rate for u in (1, 2, 3)] == [400, 400, 400]
+
+    third.release()
+    assert 3 not in limiter.active
+    assert [limiter._buckets[u].rate for u in (1, 2)] == [600, 600]
+
+    first.release()
+    assert limiter._buckets[1].rate == 600
+
+
+def test_sequential_transfers_share_user_bucket():
+    limiter = TransferLimiter(user_rate=100_000)
+    delays = []
+    for _ in range(3):
+        slot = limiter.acquire(1)
+        delays.append(limiter._buckets[1].reserve(100_000))
+        slot.release()
+    # Only the first transfer gets the burst, the next ones wait for refills
+    assert delays == [0.0, pytest.approx(1.0, abs=0.1), pytest.approx(2.0, abs=0.1)]
+
+
+def test_refilled_idle_bucket_is_dropped():
+    limiter = TransferLimiter(user_rate=1000)
+    slot = limiter.acquire(1)
+    limiter._buckets[1].reserve(1000)
+    slot.release()
+    limiter.acquire(2)
+    assert 1 in limiter._buckets
+
+    limiter._buckets[1].updated -= 2
+    limiter.acquire(2)
+    assert 1 not in limiter._buckets
+
+
+def test_fair_share_capped_by_user_rate():
+    limiter = TransferLimiter(user_rate=500, global_rate=1200)
+    limiter.acquire(1)
+    assert limiter._buckets[1].rate == 500
+    limiter.acquire(2)
+    limiter.acquire(3)
+    assert limiter._buckets[1].rate == 400
+
+
+def test_slot_release_is_idempotent():
+    limiter = TransferLimiter(user_concurrency=1)
+    slot = limiter.acquire(1)
+    slot.release()
+    slot.release()
+    assert limiter.total_active == 0
+    assert limiter.active == {}
+
+    # The slot freed exactly once, so the cap still holds for the next one
+    limiter.acquire(1)
+    with pytest.raises(TooManyTransfers):
+        limiter.acquire(1)